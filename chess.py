@@ -1,10 +1,9 @@
 import sys
 import os
 import pygame
-import copy
+from collections import namedtuple
 
 # Constants
-FPS = 10
 WINDOWWIDTH = 1100
 WINDOWHEIGHT = 1000
 CELLSIZE = 100
@@ -19,6 +18,89 @@ BLACK = (0, 0, 0)
 BGCOLOR = GRAY
 
 PIECE_IMAGES = {}
+TEXT_CACHE = {}  # (text, color, style) -> rendered surface
+
+# Piece types, bitboards are indexed by piece_type * 2 + color
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+COLOR_INDEX = {'w': 0, 'b': 1}
+
+# Attack tables, squares are numbered row * 8 + col
+def build_leaper_attacks(offsets):
+    attacks = []
+    for sq in range(64):
+        x, y = divmod(sq, 8)
+        mask = 0
+        for dx, dy in offsets:
+            if 0 <= x + dx < 8 and 0 <= y + dy < 8:
+                mask |= 1 << ((x + dx) * 8 + y + dy)
+        attacks.append(mask)
+    return attacks
+
+def build_rays(dx, dy):
+    rays = []
+    for sq in range(64):
+        x, y = divmod(sq, 8)
+        mask = 0
+        x, y = x + dx, y + dy
+        while 0 <= x < 8 and 0 <= y < 8:
+            mask |= 1 << (x * 8 + y)
+            x, y = x + dx, y + dy
+        rays.append(mask)
+    return rays
+
+KNIGHT_ATTACKS = build_leaper_attacks([(2, 1), (1, 2), (-1, 2), (-2, 1), (-2, -1), (-1, -2), (1, -2), (2, -1)])
+KING_ATTACKS = build_leaper_attacks([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+# White pawns move towards row 0, black pawns towards row 7
+PAWN_ATTACKS = [build_leaper_attacks([(-1, -1), (-1, 1)]), build_leaper_attacks([(1, -1), (1, 1)])]
+PAWN_PUSHES = [build_leaper_attacks([(-1, 0)]), build_leaper_attacks([(1, 0)])]
+# Double pushes only exist from the starting row
+PAWN_DOUBLE_PUSHES = [[mask if sq >> 3 == start_row else 0 for sq, mask in enumerate(build_leaper_attacks([(2 * dx, 0)]))]
+                      for dx, start_row in ((-1, 6), (1, 1))]
+
+ROOK_DIRECTIONS = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+BISHOP_DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+RAY = {direction: build_rays(*direction) for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+def build_between():
+    # BETWEEN[a][b] holds the squares strictly between a and b when they share a line, otherwise 0
+    between = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for dx, dy in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            x, y = divmod(sq, 8)
+            x, y = x + dx, y + dy
+            mask = 0
+            while 0 <= x < 8 and 0 <= y < 8:
+                between[sq][x * 8 + y] = mask
+                mask |= 1 << (x * 8 + y)
+                x, y = x + dx, y + dy
+    return between
+
+BETWEEN = build_between()
+# (ray table, ray walks towards higher squares) for each direction, so slider_attacks needs no lookups
+ROOK_RAYS = [(RAY[(dx, dy)], dx * 8 + dy > 0) for dx, dy in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(RAY[(dx, dy)], dx * 8 + dy > 0) for dx, dy in BISHOP_DIRECTIONS]
+
+def iter_squares(mask):
+    """Yield the index of every set bit in mask, lowest first."""
+    while mask:
+        bit = mask & -mask
+        yield bit.bit_length() - 1
+        mask ^= bit
+
+def slider_attacks(sq, occ, rays):
+    """Squares attacked from sq along the given rays, up to and including the first blocker."""
+    attacks = 0
+    for table, ascending in rays:
+        ray = table[sq]
+        blockers = ray & occ
+        if blockers:
+            # Nearest blocker is the lowest bit on rays going up the board, the highest otherwise
+            if ascending:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= table[blocker]
+        attacks |= ray
+    return attacks
 
 # Load Piece Images
 def load_images():
@@ -28,422 +110,516 @@ def load_images():
     
     for name in pieces:
         image_path = os.path.join(image_folder, f"{name}.png")
-        image = pygame.image.load(image_path)
-        resized_image = pygame.transform.scale(image, (CELLSIZE, CELLSIZE))
+        # Convert to the display format once so blits need no per-frame conversion
+        image = pygame.image.load(image_path).convert_alpha()
+        resized_image = pygame.transform.smoothscale(image, (CELLSIZE, CELLSIZE))
         PIECE_IMAGES[name] = resized_image
 
 # Base Class for Pieces
 class Piece:
-    def __init__(self, color, position):
+    __slots__ = ('color', 'sq', 'has_moved')
+
+    def __init__(self, color, sq):
         self.color = color
-        self.position = position
+        self.sq = sq  # row * 8 + col
         self.has_moved = False
 
-    def move(self, new_position):
-        self.position = new_position
+    def move(self, new_sq):
+        self.sq = new_sq
 
     def get_image_key(self):
         raise NotImplementedError("Must be implemented in subclass")
 
-    def is_valid_move(self, end_position, board):
+    def is_valid_move(self, end_sq, board):
         raise NotImplementedError("Must be implemented in subclass")
 
 # Pawn Class
 class Pawn(Piece):
-    def __init__(self, color, position):
-        super().__init__(color, position)
-        self.can_be_captured_en_passant = False
+    TYPE = PAWN
+    __slots__ = ()
 
     def get_image_key(self):
         return f'{self.color}p'
 
-    def is_valid_move(self, end_position, board):
-        start_x, start_y = self.position
-        end_x, end_y = end_position
-        direction = -1 if self.color == 'w' else 1
-        start_row = 6 if self.color == 'w' else 1
+    def is_valid_move(self, end_sq, board):
+        color = COLOR_INDEX[self.color]
+        target = 1 << end_sq
 
         # Single square forward
-        if end_y == start_y and end_x == start_x + direction and not board.get_piece(end_position):
-            return True
+        if target & PAWN_PUSHES[color][self.sq]:
+            return not board.occ & target
 
-        # Double square forward
-        if (start_x == start_row and end_y == start_y and 
-            end_x == start_x + 2 * direction and 
-            not board.get_piece([start_x + direction, start_y]) and
-            not board.get_piece(end_position)):
-            return True
+        # Double square forward, the square in between must be empty too
+        if target & PAWN_DOUBLE_PUSHES[color][self.sq]:
+            return not board.occ & (target | PAWN_PUSHES[color][self.sq])
 
-        # Diagonal capture
-        if abs(end_y - start_y) == 1 and end_x == start_x + direction:
-            target = board.get_piece(end_position)
-            if target and target.color != self.color:
-                return True
-
-            # En passant
-            adjacent_pawn = board.get_piece([start_x, end_y])
-            if isinstance(adjacent_pawn, Pawn) and adjacent_pawn.color != self.color:
-                if adjacent_pawn.can_be_captured_en_passant:
-                    return True
+        # Diagonal capture, or en passant onto the square a pawn just skipped
+        if target & PAWN_ATTACKS[color][self.sq]:
+            opponent = board.occ_b if color == 0 else board.occ_w
+            return bool(target & opponent) or end_sq == board.ep_square
 
         return False
 
 # Rook Class
 class Rook(Piece):
-    def __init__(self, color, position):
-        super().__init__(color, position)
+    TYPE = ROOK
+    __slots__ = ()
 
     def get_image_key(self):
         return f'{self.color}r'
 
-    def is_valid_move(self, end_position, board):
-        start_x, start_y = self.position
-        end_x, end_y = end_position
-
-        if start_x != end_x and start_y != end_y:
+    def is_valid_move(self, end_sq, board):
+        start_sq = self.sq
+        if start_sq >> 3 != end_sq >> 3 and start_sq & 7 != end_sq & 7:
             return False
 
         # Path clearance
-        if start_x == end_x:  # Vertical move
-            step = 1 if end_y > start_y else -1
-            for y in range(start_y + step, end_y, step):
-                if board.get_piece([start_x, y]):
-                    return False
-        else:  # Horizontal move
-            step = 1 if end_x > start_x else -1
-            for x in range(start_x + step, end_x, step):
-                if board.get_piece([x, start_y]):
-                    return False
-        return True
+        return not BETWEEN[start_sq][end_sq] & board.occ
 
 # Knight Class
 class Knight(Piece):
-    def __init__(self, color, position):
-        super().__init__(color, position)
+    TYPE = KNIGHT
+    __slots__ = ()
 
     def get_image_key(self):
         return f'{self.color}n'
 
-    def is_valid_move(self, end_position, board):
-        start_x, start_y = self.position
-        end_x, end_y = end_position
-        dx = abs(end_x - start_x)
-        dy = abs(end_y - start_y)
-        return (dx, dy) in [(2, 1), (1, 2)]  # Knight move L-shape
+    def is_valid_move(self, end_sq, board):
+        # Knight move L-shape, looked up in the precomputed table
+        if not (KNIGHT_ATTACKS[self.sq] >> end_sq) & 1:
+            return False
+        target = board.get_piece(end_sq)
+        return target is None or target.color != self.color
 
 # Bishop Class
 class Bishop(Piece):
-    def __init__(self, color, position):
-        super().__init__(color, position)
+    TYPE = BISHOP
+    __slots__ = ()
 
     def get_image_key(self):
         return f'{self.color}b'
 
-    def is_valid_move(self, end_position, board):
-        start_x, start_y = self.position
-        end_x, end_y = end_position
-        dx = end_x - start_x
-        dy = end_y - start_y
+    def is_valid_move(self, end_sq, board):
+        start_sq = self.sq
+        dx = (end_sq >> 3) - (start_sq >> 3)
+        dy = (end_sq & 7) - (start_sq & 7)
         if abs(dx) != abs(dy):
             return False
-        step_x = 1 if dx > 0 else -1
-        step_y = 1 if dy > 0 else -1
-        for i in range(1, abs(dx)):
-            if board.get_piece([start_x + i * step_x, start_y + i * step_y]):
-                return False
-        return True
+
+        # Path clearance
+        return not BETWEEN[start_sq][end_sq] & board.occ
 
 # Queen Class
 class Queen(Piece):
-    def __init__(self, color, position):
-        super().__init__(color, position)
+    TYPE = QUEEN
+    __slots__ = ()
 
     def get_image_key(self):
         return f'{self.color}q'
 
-    def is_valid_move(self, end_position, board):
+    def is_valid_move(self, end_sq, board):
         # Queen moves like both a Rook and a Bishop
-        rook = Rook(self.color, self.position)
-        bishop = Bishop(self.color, self.position)
-        return rook.is_valid_move(end_position, board) or bishop.is_valid_move(end_position, board)
+        start_sq = self.sq
+        dx = (end_sq >> 3) - (start_sq >> 3)
+        dy = (end_sq & 7) - (start_sq & 7)
+        if dx != 0 and dy != 0 and abs(dx) != abs(dy):
+            return False
+
+        # Path clearance
+        return not BETWEEN[start_sq][end_sq] & board.occ
 
 # King Class
 class King(Piece):
-    def __init__(self, color, position):
-        super().__init__(color, position)
+    TYPE = KING
+    __slots__ = ()
 
     def get_image_key(self):
         return f'{self.color}k'
 
-    def is_valid_move(self, end_position, board):
-        start_x, start_y = self.position
-        end_x, end_y = end_position
+    def is_valid_move(self, end_sq, board):
+        start_x, start_y = self.sq >> 3, self.sq & 7
+        end_x, end_y = end_sq >> 3, end_sq & 7
 
         # Normal king move (one square in any direction)
-        if abs(end_x - start_x) <= 1 and abs(end_y - start_y) <= 1:
-            target = board.get_piece(end_position)
+        if (KING_ATTACKS[self.sq] >> end_sq) & 1:
+            target = board.get_piece(end_sq)
             return target is None or target.color != self.color
 
         # Castling
         if not self.has_moved and start_x == end_x and abs(end_y - start_y) == 2:
             direction = 1 if end_y > start_y else -1
             rook_y = 7 if direction == 1 else 0
-            rook = board.get_piece([start_x, rook_y])
+            rook = board.get_piece(start_x * 8 + rook_y)
 
             # Verify the rook is present and hasn't moved
-            if isinstance(rook, Rook) and not rook.has_moved:
+            if rook and rook.TYPE == ROOK and not rook.has_moved:
                 # Check that all squares between king and rook are empty
-                for y in range(start_y + direction, rook_y, direction):
-                    if board.get_piece([start_x, y]) is not None:
-                        return False
+                if BETWEEN[self.sq][rook.sq] & board.occ:
+                    return False
 
-                # Check that the king does not pass through or end in check
-                for y in range(start_y, start_y + 3 * direction, direction):
-                    test_position = [start_x, y]
-                    if y != rook_y:  # Ignore the rook's position
-                        board.board[start_x][start_y] = None  # Temporarily move king
-                        board.board[start_x][y] = self
-                        in_check = board.is_king_in_check(self.color)
-                        board.board[start_x][y] = None  # Reset
-                        board.board[start_x][start_y] = self
-                        if in_check:
-                            return False
+                # Check that the king does not start, pass through or end in check
+                opponent = 'b' if self.color == 'w' else 'w'
+                for test_sq in (self.sq, self.sq + direction, end_sq):
+                    if board.is_attacked(test_sq, opponent):
+                        return False
                 return True
             
         return False
 
+# Everything needed to take a move back
+MoveUndo = namedtuple('MoveUndo', ['piece', 'start_sq', 'end_sq', 'captured', 'captured_sq', 'rook', 'has_moved', 'ep_square'])
+
 # Chess Board Class
 class ChessBoard:
     def __init__(self):
-        self.board = [[None for _ in range(8)] for _ in range(8)]
+        self.board = [None] * 64  # Indexed by row * 8 + col
+        self.bb = [0] * 12
+        self.occ_w = 0
+        self.occ_b = 0
+        self.occ = 0
+        self.ep_square = None  # Square skipped by a double pawn move, capturable en passant next move
+        self.history = []
+        self.setup_board()
+
+    def reset(self):
+        """Start a new game on this board."""
+        for sq in range(64):
+            self.board[sq] = None
+        self.ep_square = None
+        self.history.clear()
         self.setup_board()
-        self.last_state = None
 
     def setup_board(self):
         # Place pawns
         for i in range(8):
-            self.board[1][i] = Pawn('b', [1, i])
-            self.board[6][i] = Pawn('w', [6, i])
+            self.board[8 + i] = Pawn('b', 8 + i)
+            self.board[48 + i] = Pawn('w', 48 + i)
 
         # Place Rooks
-        self.board[0][0] = Rook('b', [0, 0])
-        self.board[0][7] = Rook('b', [0, 7])
-        self.board[7][0] = Rook('w', [7, 0])
-        self.board[7][7] = Rook('w', [7, 7])
+        self.board[0] = Rook('b', 0)
+        self.board[7] = Rook('b', 7)
+        self.board[56] = Rook('w', 56)
+        self.board[63] = Rook('w', 63)
 
         # Place Knights
-        self.board[0][1] = Knight('b', [0, 1])
-        self.board[0][6] = Knight('b', [0, 6])
-        self.board[7][1] = Knight('w', [7, 1])
-        self.board[7][6] = Knight('w', [7, 6])
+        self.board[1] = Knight('b', 1)
+        self.board[6] = Knight('b', 6)
+        self.board[57] = Knight('w', 57)
+        self.board[62] = Knight('w', 62)
 
         # Place Bishops
-        self.board[0][2] = Bishop('b', [0, 2])
-        self.board[0][5] = Bishop('b', [0, 5])
-        self.board[7][2] = Bishop('w', [7, 2])
-        self.board[7][5] = Bishop('w', [7, 5])
+        self.board[2] = Bishop('b', 2)
+        self.board[5] = Bishop('b', 5)
+        self.board[58] = Bishop('w', 58)
+        self.board[61] = Bishop('w', 61)
 
         # Place Queens
-        self.board[0][3] = Queen('b', [0, 3])
-        self.board[7][3] = Queen('w', [7, 3])
+        self.board[3] = Queen('b', 3)
+        self.board[59] = Queen('w', 59)
 
         # Place Kings
-        self.board[0][4] = King('b', [0, 4])
-        self.board[7][4] = King('w', [7, 4])
+        self.board[4] = King('b', 4)
+        self.board[60] = King('w', 60)
+        self.sync_bitboards()
+
+    def sync_bitboards(self):
+        """Rebuild the piece and occupancy bitboards from the board grid."""
+        self.bb = [0] * 12
+        for sq, piece in enumerate(self.board):
+            if piece:
+                self.bb[piece.TYPE * 2 + COLOR_INDEX[piece.color]] |= 1 << sq
+        self.occ_w = 0
+        self.occ_b = 0
+        for piece_type in range(6):
+            self.occ_w |= self.bb[piece_type * 2]
+            self.occ_b |= self.bb[piece_type * 2 + 1]
+        self.occ = self.occ_w | self.occ_b
 
     def draw_board(self):
-        colors = [WHITE, GRAY]
-        for row in range(8):
-            for col in range(8):
-                color = colors[(row + col) % 2]
-                rect = pygame.Rect(col * CELLSIZE + 300, row * CELLSIZE + 100, CELLSIZE, CELLSIZE)
-                pygame.draw.rect(DISPLAYSURF, color, rect)
-
-                piece = self.board[row][col]
-                if piece:
-                    piece_image = PIECE_IMAGES.get(piece.get_image_key())
-                    if piece_image:
-                        DISPLAYSURF.blit(piece_image, rect.topleft)
-                pygame.draw.rect(DISPLAYSURF, BLACK, (296, 96,807,807), OUTLINE_WIDTH)
-
-    def save_state(self):
-         self.last_state = copy.deepcopy(self.board)
+        # The squares come from BOARD_BG, only the pieces are drawn here
+        for sq in iter_squares(self.occ):
+            row, col = divmod(sq, 8)
+            piece_image = PIECE_IMAGES.get(self.board[sq].get_image_key())
+            if piece_image:
+                DISPLAYSURF.blit(piece_image, (col * CELLSIZE + 300, row * CELLSIZE + 100))
 
     def undo_move(self):
-        if self.last_state:
-            self.board = self.last_state
-            self.last_state = None  
+        if self.history:
+            self.unmake_move(self.history.pop())
 
-
-    def get_piece(self, position):
-        x, y = position
-        if 0 <= x < 8 and 0 <= y < 8:
-            return self.board[x][y]
+    def get_piece(self, sq):
+        if 0 <= sq < 64:
+            return self.board[sq]
         return None
 
-    def move_piece(self, start_pos, end_pos, color):
-        start_x, start_y = start_pos
-        end_x, end_y = end_pos
-        piece = self.get_piece(start_pos)
+    def set_piece(self, sq, piece):
+        """Put piece (or None) on sq, keeping the bitboards in step with the grid."""
+        bit = 1 << sq
+        old = self.board[sq]
+        if old:
+            self.bb[old.TYPE * 2 + COLOR_INDEX[old.color]] &= ~bit
+            if old.color == 'w':
+                self.occ_w &= ~bit
+            else:
+                self.occ_b &= ~bit
+        if piece:
+            self.bb[piece.TYPE * 2 + COLOR_INDEX[piece.color]] |= bit
+            if piece.color == 'w':
+                self.occ_w |= bit
+            else:
+                self.occ_b |= bit
+        self.occ = self.occ_w | self.occ_b
+        self.board[sq] = piece
+
+    def make_move(self, start_sq, end_sq):
+        """Play a move without validating it and return the MoveUndo that takes it back."""
+        start_x, start_y = start_sq >> 3, start_sq & 7
+        end_x, end_y = end_sq >> 3, end_sq & 7
+        piece = self.get_piece(start_sq)
+        captured = self.get_piece(end_sq)
+        captured_sq = end_sq
+        rook = None
+
+        ep_square = self.ep_square
+
+        # Handle en passant capture
+        if piece.TYPE == PAWN and end_sq == ep_square:
+            # The captured pawn sits beside the moving pawn, not on the square it moves to
+            captured_sq = start_x * 8 + end_y
+            captured = self.get_piece(captured_sq)
+            self.set_piece(captured_sq, None)
+
+        # Handle double square pawn move, the skipped square can be captured en passant next move
+        if piece.TYPE == PAWN and abs(end_x - start_x) == 2:
+            self.ep_square = (start_sq + end_sq) // 2
+        else:
+            self.ep_square = None
+
+        # Handle castling
+        if piece.TYPE == KING and abs(end_y - start_y) == 2:
+            direction = 1 if end_y > start_y else -1
+            rook_sq = start_x * 8 + (7 if direction == 1 else 0)
+            rook = self.get_piece(rook_sq)
+            # Move rook to the square next to the king
+            self.set_piece(rook_sq, None)
+            self.set_piece(start_sq + direction, rook)
+            rook.move(start_sq + direction)
+
+        undo = MoveUndo(piece, start_sq, end_sq, captured, captured_sq, rook, piece.has_moved, ep_square)
+        self.set_piece(end_sq, piece)
+        self.set_piece(start_sq, None)
+        piece.move(end_sq)
+        piece.has_moved = True  # Mark the piece as having moved
+        return undo
+
+    def unmake_move(self, undo):
+        """Restore the squares and flags touched by the move undo was recorded for."""
+        start_sq = undo.start_sq
+        piece = undo.piece
+
+        self.set_piece(undo.end_sq, None)
+        self.set_piece(start_sq, piece)
+        piece.move(start_sq)
+        piece.has_moved = undo.has_moved
+        if undo.captured:
+            self.set_piece(undo.captured_sq, undo.captured)
+
+        # Undo castling rook move, if applicable
+        if undo.rook:
+            direction = 1 if undo.end_sq > start_sq else -1
+            rook_sq = (start_sq & ~7) + (7 if direction == 1 else 0)
+            self.set_piece(start_sq + direction, None)
+            self.set_piece(rook_sq, undo.rook)
+            undo.rook.move(rook_sq)
+
+        self.ep_square = undo.ep_square
+
+    def move_piece(self, start_sq, end_sq, color):
+        piece = self.get_piece(start_sq)
 
         if not piece or piece.color != color:
             return False
-        
-        self.save_state()
-        if piece.is_valid_move(end_pos, self):
-            # Handle en passant capture
-            if isinstance(piece, Pawn) and abs(end_y - start_y) == 1 and not self.get_piece(end_pos):
-                # If moving diagonally to an empty square, remove the pawn captured en passant
-                captured_pawn_pos = [start_x, end_y]
-                captured_pawn = self.get_piece(captured_pawn_pos)
-                self.board[captured_pawn_pos[0]][captured_pawn_pos[1]] = None
-
-            # Clear en passant eligibility for all pawns of the same color
-            for row in self.board:
-                for p in row:
-                    if isinstance(p, Pawn) and p.color == color:
-                        p.can_be_captured_en_passant = False
-
-            # Handle double square pawn move
-            if isinstance(piece, Pawn) and abs(end_x - start_x) == 2:
-                piece.can_be_captured_en_passant = True
-                        
-            # Handle castling
-            if isinstance(piece, King) and abs(end_y - start_y) == 2:
-                direction = 1 if end_y > start_y else -1
-                rook_y = 7 if direction == 1 else 0
-                rook = self.get_piece([start_x, rook_y])
-                if rook and isinstance(rook, Rook):
-                    # Move rook to the square next to the king
-                    self.board[start_x][rook_y] = None
-                    self.board[start_x][start_y + direction] = rook
-                    rook.move([start_x, start_y + direction])
-                    
-            # Simulate the move
-            original_piece = self.board[end_x][end_y]
-            self.board[end_x][end_y] = piece
-            self.board[start_x][start_y] = None
-            piece.move(end_pos)
-
-            # Update last moved piece
-            self.last_moved_piece = piece
 
-            # Check if the move leaves the king in check
-            if self.is_king_in_check(color):
-                # Undo the move if it leaves the king in check
-                self.board[start_x][start_y] = piece
-                self.board[end_x][end_y] = original_piece
-                piece.move(start_pos)
-
-                # Undo en passant capture, if applicable
-                if isinstance(piece, Pawn) and abs(end_y - start_y) == 1 and not self.get_piece([start_x + direction, start_y]):
-                    self.board[captured_pawn_pos[0]][captured_pawn_pos[1]] = captured_pawn
-                
-                # Undo castling rook move, if applicable
-                if isinstance(piece, King) and abs(end_y - start_y) == 2:
-                    self.board[start_x][start_y + direction] = None
-                    self.board[start_x][rook_y] = rook
-                    rook.move([start_x, rook_y])
-                    
-                return False
-            
-            piece.has_moved = True  # Mark the piece as having moved
-            return True
+        if not piece.is_valid_move(end_sq, self):
+            return False
 
-        return False
+        undo = self.make_move(start_sq, end_sq)
+
+        # Check if the move leaves the king in check
+        if self.is_king_in_check(color):
+            self.unmake_move(undo)
+            return False
+
+        self.history.append(undo)
+        return True
     
     def is_king_in_check(self, color):
         """ Check if the king of the given color is in check. """
-        king_position = None
-        opponent_color = 'b' if color == 'w' else 'w'
-
-        # Find the king's position
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and isinstance(piece, King) and piece.color == color:
-                    king_position = [row, col]
-                    break
-            if king_position:
-                break
-
-        if not king_position:
+        king = self.bb[KING * 2 + COLOR_INDEX[color]]
+        if not king:
             raise ValueError(f"No king found for color {color} on the board.")
+        return self.is_attacked(king.bit_length() - 1, 'b' if color == 'w' else 'w')
+
+    def is_attacked(self, sq, by_color):
+        """Check if any piece of by_color attacks sq, looking outwards from sq for each kind of attacker."""
+        attacker = COLOR_INDEX[by_color]
+        bb = self.bb
 
-        # Check if any opponent piece can attack the king
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.color == opponent_color:
-                    if piece.is_valid_move(king_position, self):
+        # Leapers, a pawn attacks sq from where a pawn of the other color on sq would attack
+        if KNIGHT_ATTACKS[sq] & bb[KNIGHT * 2 + attacker]:
+            return True
+        if PAWN_ATTACKS[1 - attacker][sq] & bb[PAWN * 2 + attacker]:
+            return True
+        if KING_ATTACKS[sq] & bb[KING * 2 + attacker]:
+            return True
+
+        # Sliders, only the nearest piece along each ray can attack sq
+        for rays, sliders in ((ROOK_RAYS, bb[ROOK * 2 + attacker] | bb[QUEEN * 2 + attacker]),
+                              (BISHOP_RAYS, bb[BISHOP * 2 + attacker] | bb[QUEEN * 2 + attacker])):
+            if not sliders:
+                continue
+            for table, ascending in rays:
+                blockers = table[sq] & self.occ
+                if blockers & sliders:
+                    nearest = (blockers & -blockers).bit_length() - 1 if ascending else blockers.bit_length() - 1
+                    if (sliders >> nearest) & 1:
                         return True
         return False
 
+    def generate_moves(self, color):
+        """Yield (start_sq, end_sq) for the pseudo-legal moves of color, which may still leave the king in check."""
+        own = self.occ_w if color == 'w' else self.occ_b
+        for sq in iter_squares(own):
+            row, col = divmod(sq, 8)
+            piece = self.board[sq]
+
+            if piece.TYPE == KNIGHT:
+                targets = KNIGHT_ATTACKS[sq]
+            elif piece.TYPE == BISHOP:
+                targets = slider_attacks(sq, self.occ, BISHOP_RAYS)
+            elif piece.TYPE == ROOK:
+                targets = slider_attacks(sq, self.occ, ROOK_RAYS)
+            elif piece.TYPE == QUEEN:
+                targets = slider_attacks(sq, self.occ, ROOK_RAYS) | slider_attacks(sq, self.occ, BISHOP_RAYS)
+            elif piece.TYPE == KING:
+                targets = KING_ATTACKS[sq]
+                # Castling moves the king two squares along its row
+                for end_col in (col - 2, col + 2):
+                    if 0 <= end_col < 8 and piece.is_valid_move(row * 8 + end_col, self):
+                        targets |= 1 << (row * 8 + end_col)
+            else:
+                index = COLOR_INDEX[color]
+                targets = PAWN_PUSHES[index][sq] & ~self.occ
+                if targets:
+                    targets |= PAWN_DOUBLE_PUSHES[index][sq] & ~self.occ
+                captures = self.occ_b if color == 'w' else self.occ_w
+                if self.ep_square is not None:
+                    captures |= 1 << self.ep_square
+                targets |= PAWN_ATTACKS[index][sq] & captures
+
+            for end_sq in iter_squares(targets & ~own):
+                yield sq, end_sq
+
+    def compute_pins(self, color):
+        """Bitboard of the pieces of color that stand between their king and an opponent slider."""
+        own = COLOR_INDEX[color]
+        opponent = 1 - own
+        bb = self.bb
+        own_occ = self.occ_w if color == 'w' else self.occ_b
+        sq = bb[KING * 2 + own].bit_length() - 1
+
+        pinned = 0
+        for rays, sliders in ((ROOK_RAYS, bb[ROOK * 2 + opponent] | bb[QUEEN * 2 + opponent]),
+                              (BISHOP_RAYS, bb[BISHOP * 2 + opponent] | bb[QUEEN * 2 + opponent])):
+            if not sliders:
+                continue
+            for table, ascending in rays:
+                # The first piece seen from the king is pinned when it is ours and the second is a slider
+                blockers = table[sq] & self.occ
+                if not blockers:
+                    continue
+                first = (blockers & -blockers).bit_length() - 1 if ascending else blockers.bit_length() - 1
+                if not (own_occ >> first) & 1:
+                    continue
+                blockers = table[first] & self.occ
+                if not blockers:
+                    continue
+                second = (blockers & -blockers).bit_length() - 1 if ascending else blockers.bit_length() - 1
+                if (sliders >> second) & 1:
+                    pinned |= 1 << first
+        return pinned
+
     def is_game_over(self, color):
         """Check if the game is over due to checkmate or stalemate."""
-        # Iterate through all pieces of the current color
-        for row in range(8):
-            for col in range(8):
-                piece = self.get_piece([row, col])
-                if piece and piece.color == color:
-                    # Check all possible moves for the piece
-                    for end_row in range(8):
-                        for end_col in range(8):
-                            end_position = [end_row, end_col]
-                            # Simulate the move to test its validity
-                            if piece.is_valid_move(end_position, self):
-                                target_piece = self.get_piece(end_position)
-                                if not isinstance(target_piece, King):
-                                    # Temporarily move the piece
-                                    original_start_piece = self.board[row][col]
-                                    original_end_piece = self.board[end_row][end_col]
-                                    self.board[row][col] = None
-                                    self.board[end_row][end_col] = piece
-                                    piece.move(end_position)
-
-                                    # Check if the move leaves the king in check
-                                    if not self.is_king_in_check(color):
-                                        # Undo the move
-                                        self.board[row][col] = original_start_piece
-                                        self.board[end_row][end_col] = original_end_piece
-                                        piece.move([row, col])
-                                        return False  # A valid move exists
-
-                                    # Undo the move
-                                    self.board[row][col] = original_start_piece
-                                    self.board[end_row][end_col] = original_end_piece
-                                    piece.move([row, col])
+        in_check = self.is_king_in_check(color)
+        # Out of check, only the king, a pinned piece or an en passant capture can expose the king
+        needs_check = 0 if in_check else self.compute_pins(color) | self.bb[KING * 2 + COLOR_INDEX[color]]
+
+        for start_sq, end_sq in self.generate_moves(color):
+            if not in_check and not (needs_check >> start_sq) & 1 and end_sq != self.ep_square:
+                return False  # A valid move exists
+
+            # Temporarily make the move
+            undo = self.make_move(start_sq, end_sq)
+            leaves_check = self.is_king_in_check(color)
+            self.unmake_move(undo)
+
+            # Check if the move leaves the king in check
+            if not leaves_check:
+                return False  # A valid move exists
 
         # No valid moves found; determine the result
-        if self.is_king_in_check(color):
+        if in_check:
             return "checkmate"  # King is in check and no valid moves
         return "stalemate"  # No valid moves but king is not in check
 
-def draw_ui(turn, score_b, score_w):
-    # Draws Buttons
-    draw_text(150,450,"New game",BLACK,1)
-    draw_text(150,550,"Step back",BLACK,1)
-    draw_text(150,650,"Draw",BLACK,1)
-    draw_text(150,750,"Forfeit",BLACK,1)
-    pygame.draw.rect(DISPLAYSURF, BLACK, (0, 400, 300, 100+2),OUTLINE_WIDTH)
-    pygame.draw.rect(DISPLAYSURF, BLACK, (0, 500-2, 300, 100+4),OUTLINE_WIDTH)
-    pygame.draw.rect(DISPLAYSURF, BLACK, (0, 600-2, 300, 100+4),OUTLINE_WIDTH)
-    pygame.draw.rect(DISPLAYSURF, BLACK, (0, 700-2, 300, 100+4),OUTLINE_WIDTH)
+def build_background():
+    """Pre-render everything that never changes: the squares, the outlines and the fixed labels."""
+    background = pygame.Surface((WINDOWWIDTH, WINDOWHEIGHT)).convert()
+    background.fill(BGCOLOR)
+
+    # Board
+    colors = [WHITE, GRAY]
+    for row in range(8):
+        for col in range(8):
+            color = colors[(row + col) % 2]
+            rect = pygame.Rect(col * CELLSIZE + 300, row * CELLSIZE + 100, CELLSIZE, CELLSIZE)
+            pygame.draw.rect(background, color, rect)
+    pygame.draw.rect(background, BLACK, (296, 96,807,807), OUTLINE_WIDTH)
+
+    # Buttons
+    draw_text(150,450,"New game",BLACK,1,background)
+    draw_text(150,550,"Step back",BLACK,1,background)
+    draw_text(150,650,"Draw",BLACK,1,background)
+    draw_text(150,750,"Forfeit",BLACK,1,background)
+    pygame.draw.rect(background, BLACK, (0, 400, 300, 100+2),OUTLINE_WIDTH)
+    pygame.draw.rect(background, BLACK, (0, 500-2, 300, 100+4),OUTLINE_WIDTH)
+    pygame.draw.rect(background, BLACK, (0, 600-2, 300, 100+4),OUTLINE_WIDTH)
+    pygame.draw.rect(background, BLACK, (0, 700-2, 300, 100+4),OUTLINE_WIDTH)
 
     # Players
-    draw_text(500, 50, "Player 2", BLACK, 1)
-    pygame.draw.rect(DISPLAYSURF, BLACK, (300, 0, 100, 100))
-    pygame.draw.rect(DISPLAYSURF, BLACK, (398, 0, 200+4, 100),OUTLINE_WIDTH)
-    draw_text(500, 950, "Player 1", BLACK, 1)
-    pygame.draw.rect(DISPLAYSURF, WHITE, (296, 900+3, 100+1, 100-6))
-    pygame.draw.rect(DISPLAYSURF, BLACK, (296, 900, 106, 100), OUTLINE_WIDTH)
-    pygame.draw.rect(DISPLAYSURF, BLACK, (398, 900, 200+4, 100),OUTLINE_WIDTH)
+    draw_text(500, 50, "Player 2", BLACK, 1, background)
+    pygame.draw.rect(background, BLACK, (300, 0, 100, 100))
+    pygame.draw.rect(background, BLACK, (398, 0, 200+4, 100),OUTLINE_WIDTH)
+    draw_text(500, 950, "Player 1", BLACK, 1, background)
+    pygame.draw.rect(background, WHITE, (296, 900+3, 100+1, 100-6))
+    pygame.draw.rect(background, BLACK, (296, 900, 106, 100), OUTLINE_WIDTH)
+    pygame.draw.rect(background, BLACK, (398, 900, 200+4, 100),OUTLINE_WIDTH)
+
+    # Score
+    pygame.draw.rect(background, BLACK, (0,0, 300, 100), OUTLINE_WIDTH)
+    pygame.draw.rect(background, BLACK, (0, 900, 300, 100), OUTLINE_WIDTH)
+
+    # Whos move
+    draw_text(150,250,"turn", BLACK, 1, background)
+    pygame.draw.rect(background, BLACK, (0,96,300,206), OUTLINE_WIDTH)
+    return background
 
+def draw_ui(turn, score_b, score_w):
+    # Buttons, outlines and labels are part of BOARD_BG
     # Score
     draw_text(150, 50, f"Score: {score_b}", BLACK, 1)
-    pygame.draw.rect(DISPLAYSURF, BLACK, (0,0, 300, 100), OUTLINE_WIDTH)
     draw_text(150, 950, f"Score: {score_w}", BLACK, 1)
-    pygame.draw.rect(DISPLAYSURF, BLACK, (0, 900, 300, 100), OUTLINE_WIDTH)
 
     # Whos move
     if turn == "w":
@@ -452,21 +628,30 @@ def draw_ui(turn, score_b, score_w):
     else:
         draw_text(150,150,"Black's", BLACK, 1)
         pygame.draw.rect(DISPLAYSURF, RED, (300,3, 100, 94), OUTLINE_WIDTH)
-    draw_text(150,250,"turn", BLACK, 1)
-    pygame.draw.rect(DISPLAYSURF, BLACK, (0,96,300,206), OUTLINE_WIDTH)
 
 
 
-def draw_text(cord_x, cord_y, text ,color, style):
-    # Draws text with specified place, text, color, style.
-    if style == 1:
-        text_surface_object = BASICFONT.render(text, True, color)
-    elif style == 2:
-        text_surface_object = THROUGHSCREENFONT2.render(text, True, color)
+def cell_rect(sq):
+    # Screen rectangle of a board square
+    return pygame.Rect((sq & 7) * CELLSIZE + 300, (sq >> 3) * CELLSIZE + 100, CELLSIZE, CELLSIZE)
+
+def draw_text(cord_x, cord_y, text ,color, style, surface=None):
+    # Draws text with specified place, text, color, style. Draws on DISPLAYSURF unless given a surface.
+    # Each text is only rendered once, later calls reuse the surface.
+    key = (text, color, style)
+    text_surface_object = TEXT_CACHE.get(key)
+    if text_surface_object is None:
+        if style == 1:
+            text_surface_object = BASICFONT.render(text, True, color)
+        elif style == 2:
+            text_surface_object = THROUGHSCREENFONT2.render(text, True, color)
+        TEXT_CACHE[key] = text_surface_object
 
     text_rect_object = text_surface_object.get_rect()
     text_rect_object.center = (cord_x, cord_y)
-    DISPLAYSURF.blit(text_surface_object, text_rect_object)
+    if surface is None:
+        surface = DISPLAYSURF
+    surface.blit(text_surface_object, text_rect_object)
 
 def draw_promotion_choices(color):
     """Draw promotion choices (Knight, Bishop, Rook, Queen) with Knight and Bishop below Queen and Rook."""
@@ -496,49 +681,108 @@ def draw_end_screen(message, opacity=150):
 
 # Main Game Loop
 def main():
-    global DISPLAYSURF, BASICFONT, THROUGHSCREENFONT2
+    global DISPLAYSURF, BASICFONT, THROUGHSCREENFONT2, BOARD_BG
     pygame.init()
-    load_images()
     DISPLAYSURF = pygame.display.set_mode((WINDOWWIDTH, WINDOWHEIGHT))
+    load_images()  # Needs the display mode set for convert_alpha
     pygame.display.set_caption("Chess")
-    clock = pygame.time.Clock()
     BASICFONT = pygame.font.Font('freesansbold.ttf', 45)
     THROUGHSCREENFONT2 = pygame.font.Font('freesansbold.ttf', 90)
+    BOARD_BG = build_background()
+    # Turn, score and promotion boxes, pushed to the screen when any of them change
+    ui_rects = [pygame.Rect(0, 0, 300, 302), pygame.Rect(300, 0, 100, 100), pygame.Rect(296, 900, 106, 100),
+                pygame.Rect(0, 900, 300, 100), pygame.Rect(600, 400, 2 * CELLSIZE, 2 * CELLSIZE)]
 
 
-    promoting_pawn = None  # The pawn being promoted
+    promoting_pawn = None  # Square of the pawn being promoted
     promotion_color = None  # Color of the promoting pawn
 
     board = ChessBoard()
     selected_piece = None
     player_turn = 'w'
+    game_status = None  # Result of is_game_over, only recomputed after a move
     score_b=0
     score_w=0
+    shown = None  # (pieces, ui, selected square) last pushed to the screen, None forces a full update
+    needs_redraw = True  # Set whenever an event may have changed what the window shows
 
     while True:
-        DISPLAYSURF.fill(BGCOLOR)
-        board.draw_board()
-        draw_ui(player_turn, score_b, score_w)
+        if needs_redraw:
+            DISPLAYSURF.blit(BOARD_BG, (0, 0))
+            board.draw_board()
+            draw_ui(player_turn, score_b, score_w)
 
-        if promoting_pawn:
-            draw_promotion_choices(promotion_color)
+            if promoting_pawn is not None:
+                draw_promotion_choices(promotion_color)
 
-        
-        for event in pygame.event.get():
+            if selected_piece is not None:
+                pygame.draw.rect(DISPLAYSURF, RED, cell_rect(selected_piece), OUTLINE_WIDTH)
+            drawn_pieces = list(board.board)
+            drawn_ui = (player_turn, score_b, score_w, promoting_pawn)
+
+            # Only push the parts of the window that differ from what the screen shows
+            if shown is None:
+                pygame.display.update()
+            else:
+                shown_pieces, shown_ui, shown_selected = shown
+                dirty = [cell_rect(sq) for sq in range(64) if drawn_pieces[sq] is not shown_pieces[sq]]
+                if selected_piece != shown_selected:
+                    dirty += [cell_rect(sq) for sq in (selected_piece, shown_selected) if sq is not None]
+                if drawn_ui != shown_ui:
+                    dirty += ui_rects
+                if dirty:
+                    pygame.display.update(dirty)
+            shown = (drawn_pieces, drawn_ui, selected_piece)
+            needs_redraw = False
+
+        # Check if the game is over
+        if game_status:
+            if game_status == "checkmate":
+                winner = 'White' if player_turn == 'b' else 'Black'
+                draw_end_screen(f"Checkmate! {winner} wins!")
+                pygame.display.update()
+                pygame.time.wait(WAIT_TIME)
+                if winner == "Black":
+                    score_b += 1
+                else:
+                    score_w += 1
+            elif game_status == "stalemate":
+                # Currently not working properly             
+                draw_end_screen("Stalemate! The game is a draw.")
+                pygame.display.update()
+                pygame.time.wait(WAIT_TIME)
+                score_w += 0.5
+                score_b += 0.5
+            board.reset()
+            selected_piece = None
+            player_turn = 'w'
+            game_status = None
+            shown = None  # The end screen covered the whole window
+            needs_redraw = True
+            continue
+
+        # Sleep until the player does something
+        for event in [pygame.event.wait()] + pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
+
+            elif event.type == pygame.VIDEOEXPOSE:
+                shown = None
+                needs_redraw = True
                 
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 mouse_x, mouse_y = event.pos
+                needs_redraw = True
 
 
 
                 
-                if mouse_x >= 300 and (mouse_y >= 100 and mouse_y <= 900): #ChessBoard part
+                if mouse_x >= 300 and (mouse_y >= 100 and mouse_y < 900): #ChessBoard part
                     row = (mouse_y - 100) // CELLSIZE
                     col = (mouse_x - 300) // CELLSIZE
-                    if promoting_pawn:
+                    sq = row * 8 + col
+                    if promoting_pawn is not None:
                         # Handle promotion selection
                         x_start = 600
                         y_start = 400
@@ -550,56 +794,62 @@ def main():
                             
                             if rect.collidepoint(mouse_x, mouse_y):
                                 # Promote pawn
-                                row, col = promoting_pawn
+                                sq = promoting_pawn
                                 if piece == 'n':
-                                    board.board[row][col] = Knight(promotion_color, [row, col])
+                                    board.set_piece(sq, Knight(promotion_color, sq))
                                 elif piece == 'b':
-                                    board.board[row][col] = Bishop(promotion_color, [row, col])
+                                    board.set_piece(sq, Bishop(promotion_color, sq))
                                 elif piece == 'r':
-                                    board.board[row][col] = Rook(promotion_color, [row, col])
+                                    board.set_piece(sq, Rook(promotion_color, sq))
                                 elif piece == 'q':
-                                    board.board[row][col] = Queen(promotion_color, [row, col])
+                                    board.set_piece(sq, Queen(promotion_color, sq))
                                 promoting_pawn = None
                                 promotion_color = None
                                 # Switch turns
                                 player_turn = 'b' if player_turn == 'w' else 'w'
+                                game_status = board.is_game_over(player_turn)
                                 break  # Exit after promotion
-                    if selected_piece:
-                        if board.get_piece([row, col]) is not None and board.get_piece([row, col]).color == player_turn:
-                            selected_piece = [row, col]
-                        elif board.move_piece(selected_piece, [row, col], player_turn):
-                            piece = board.get_piece([row, col])
+                    if selected_piece is not None:
+                        if board.get_piece(sq) is not None and board.get_piece(sq).color == player_turn:
+                            selected_piece = sq
+                        elif board.move_piece(selected_piece, sq, player_turn):
+                            piece = board.get_piece(sq)
                             selected_piece = None
                             # Check for promotion
-                            if isinstance(piece, Pawn) and (row == 0 or row == 7):
-                                promoting_pawn = [row, col]
+                            if piece.TYPE == PAWN and (row == 0 or row == 7):
+                                promoting_pawn = sq
                                 promotion_color = piece.color
                             else:
                                 # Switch turns
                                 player_turn = 'b' if player_turn == 'w' else 'w'
+                                game_status = board.is_game_over(player_turn)
 
                     else:
-                        piece = board.get_piece([row, col])
+                        piece = board.get_piece(sq)
                         if piece and piece.color == player_turn:
-                            selected_piece = [row, col]
+                            selected_piece = sq
                 else: #UI part
                     row = mouse_y // CELLSIZE
                     col = mouse_x // CELLSIZE
                     if row == 4:
-                        board.__init__()
+                        board.reset()
                         selected_piece = None
                         player_turn = 'w'
+                        game_status = None
                     elif row == 5:
-                        if board.last_state is not None:
+                        if board.history:
                             board.undo_move()
                             selected_piece = None
                             player_turn = 'b' if player_turn == 'w' else 'w'
+                            game_status = None
                     elif row == 6:
                         draw_end_screen(f"Draw!")
                         pygame.display.update()
                         pygame.time.wait(WAIT_TIME)    
+                        shown = None  # The end screen covered the whole window
                         selected_piece = None
                         player_turn = 'w'
+                        game_status = None
                         score_w += 0.5
                         score_b += 0.5
                     elif row == 7:
@@ -607,46 +857,15 @@ def main():
                         draw_end_screen(f"Forfeit! {winner} wins!")
                         pygame.display.update()
                         pygame.time.wait(WAIT_TIME)
+                        shown = None  # The end screen covered the whole window
                         if winner == "Black":
                             score_b += 1
                         else:
                             score_w += 1
-                        board.__init__()        
+                        board.reset()
                         selected_piece = None
                         player_turn = 'w'
-
-        if selected_piece:
-            pygame.draw.rect(DISPLAYSURF, RED, (selected_piece[1] * CELLSIZE + 300, selected_piece[0] * CELLSIZE + 100, CELLSIZE, CELLSIZE), OUTLINE_WIDTH)
-
-        # Check if the game is over
-        game_status = board.is_game_over(player_turn)
-        if game_status:
-            if game_status == "checkmate":
-                board.draw_board()
-                winner = 'White' if player_turn == 'b' else 'Black'
-                draw_end_screen(f"Checkmate! {winner} wins!")
-                pygame.display.update()
-                pygame.time.wait(WAIT_TIME)
-                if winner == "Black":
-                    score_b += 1
-                else:
-                    score_w += 1
-                board.__init__()        
-                selected_piece = None
-                player_turn = 'w'
-            elif game_status == "stalemate":
-                # Currently not working properly             
-                draw_end_screen("Stalemate! The game is a draw.")
-                pygame.display.update()
-                pygame.time.wait(WAIT_TIME)
-                score_w += 0.5
-                score_b += 0.5
-                board.__init__()        
-                selected_piece = None
-                player_turn = 'w'
-
-        pygame.display.update()
-        clock.tick(FPS)
+                        game_status = None
 
 if __name__ == "__main__":
     main()